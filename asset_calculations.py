@@ -1,23 +1,71 @@
+import math
 import numpy as np
-import yfinance as yf
-import matplotlib.pyplot as plt
+import pandas as pd
+from numba import njit
+
+_SQRT_252 = math.sqrt(252.0)
+
+# (asset, start_time, end_time) -> adjusted close prices, see _fetch_adj_close
+_ADJ_CLOSE_CACHE = {}
+_ADJ_CLOSE_CACHE_SIZE = 64
 
 def sharpe_ratio(asset_returns: float, rfr: float): 
     """
     returns the sharpe ratio for an asset
     
     parameters:
-        asset_returns (float): vector of daily asset returns
+        asset_returns (float): vector of daily asset returns, or a DataFrame with one column per asset
         rfr (float): scalar value of risk free rate
     returns:
-        sharpe_ratio (float): sharpe ratio of asset
+        sharpe_ratio (float): sharpe ratio of asset, a Series of ratios per column for a DataFrame
     """
     
-    excess_rets = asset_returns - (rfr / 252)
-    sigma = excess_rets.std()
-    return np.sqrt(252) * (excess_rets.mean() / sigma)
+    if isinstance(asset_returns, pd.DataFrame):
+        return asset_returns.apply(lambda returns: _sharpe_ratio(returns.to_numpy(dtype=np.float64), rfr))
+    
+    asset_returns = np.asarray(asset_returns, dtype=np.float64)
+    if asset_returns.ndim != 1:
+        raise ValueError("asset_returns must be a vector of returns or a DataFrame with one column per asset")
+    
+    return _sharpe_ratio(asset_returns, rfr)
+
 
+
+@njit(cache=True, error_model="numpy")
+def _sharpe_ratio(asset_returns: np.ndarray, rfr: float):
+    """
+    annualised sharpe ratio from a single pass over the daily returns
     
+    parameters:
+        asset_returns (np.ndarray): vector of daily asset returns, nan values are skipped
+        rfr (float): scalar value of risk free rate
+    returns:
+        sharpe_ratio (float): sharpe ratio of asset
+    """
+    
+    daily_rfr = rfr / 252.0
+    
+    # welford's update, still a single pass but the variance cannot go negative
+    n = 0
+    mean = 0.0
+    sum_sq_dev = 0.0
+    for i in range(asset_returns.shape[0]):
+        if np.isnan(asset_returns[i]):
+            continue
+        excess = asset_returns[i] - daily_rfr
+        n += 1
+        delta = excess - mean
+        mean += delta / n
+        sum_sq_dev += delta * (excess - mean)
+    
+    if n < 2:
+        return np.nan
+    
+    # sample variance, matching pandas' std
+    variance = sum_sq_dev / (n - 1)
+    return _SQRT_252 * mean / math.sqrt(variance)
+    
+
 
 def beta(index_returns: float, asset_returns: float):
     """
@@ -30,8 +78,12 @@ def beta(index_returns: float, asset_returns: float):
         beta (float): beta for an asset
     """
     
-    covariance = np.cov(index_returns, asset_returns)[0][1]
-    return covariance / np.var(index_returns)
+    index_returns = np.asarray(index_returns, dtype=np.float64)
+    asset_returns = np.asarray(asset_returns, dtype=np.float64)
+    
+    # the 1 / n normalisation of the covariance and variance cancels
+    index_dev = index_returns - index_returns.mean()
+    return (index_dev * (asset_returns - asset_returns.mean())).sum() / (index_dev * index_dev).sum()
 
 
 
@@ -49,18 +101,26 @@ def asset_drawdown(asset: str, start_time: str, end_time: str=None, plot: bool=F
         max_daily_drawdowns (float, vector): vector of the maximum daily drawdown over a 252 day window 
     """
     
-    data = yf.download(asset, start=start_time, end=end_time)["Adj Close"]
+    data = _fetch_adj_close(asset, start_time, end_time)
     window = 252
     
-    rolling_max = data.rolling(window, min_periods=1).max()
-    daily_drawdown = data / rolling_max - 1
-    max_daily_drawdown = daily_drawdown.rolling(window, min_periods=1).min()
+    prices = data.to_numpy(dtype=np.float64)
+    
+    # the rolling max buffer is not needed afterwards, so the drawdown is written over it in place
+    drawdowns = _rolling_extreme(prices, window, True)
+    np.divide(prices, drawdowns, out=drawdowns)
+    drawdowns -= 1
+    
+    daily_drawdown = pd.Series(drawdowns, index=data.index, name=data.name)
+    max_daily_drawdown = pd.Series(_rolling_extreme(drawdowns, window, False), index=data.index, name=data.name)
     
     print(f"Maximum Drawdown: {daily_drawdown.min() * 100:.2f}% on {daily_drawdown.idxmin().strftime('%d-%m-%Y')}")
     print(f"Recent {window} Day Maximum Drawdown: {max_daily_drawdown[-1] * 100:.2f}% on \
         {max_daily_drawdown.loc[max_daily_drawdown == max_daily_drawdown[-1]].index[0].strftime('%d-%m-%Y')}")
     
     if plot:
+        import matplotlib.pyplot as plt
+        
         fig, ax = plt.subplots(2, 1, figsize=(18, 6), sharex=False)
         
         fig.suptitle(f"Drawdown Information for {asset}")
@@ -77,6 +137,78 @@ def asset_drawdown(asset: str, start_time: str, end_time: str=None, plot: bool=F
         ax[1].legend()
     else:
         return daily_drawdown, max_daily_drawdown
+
+
+
+def _fetch_adj_close(asset: str, start_time: str, end_time: str=None):
+    """
+    downloads the adjusted close prices for an asset, cached so repeated analyses skip the download
+    
+    only closed ranges are cached, an open end_time means "up to today" and is always downloaded,
+    as are failed downloads (yfinance returns an empty frame) so they can be retried
+    
+    parameters:
+        asset: asset ticker
+        start_time: time to start data from
+        end_time: optional time to end data
+    returns:
+        data (pd.Series): vector of adjusted close prices, shared between calls so it should not be mutated
+    """
+    
+    key = (asset, start_time, end_time)
+    if end_time is not None and key in _ADJ_CLOSE_CACHE:
+        return _ADJ_CLOSE_CACHE[key]
+    
+    import yfinance as yf
+    
+    data = yf.download(asset, start=start_time, end=end_time)["Adj Close"]
+    
+    if end_time is not None and not data.empty:
+        if len(_ADJ_CLOSE_CACHE) >= _ADJ_CLOSE_CACHE_SIZE:
+            # dicts keep insertion order, so this evicts the oldest entry
+            del _ADJ_CLOSE_CACHE[next(iter(_ADJ_CLOSE_CACHE))]
+        _ADJ_CLOSE_CACHE[key] = data
     
+    return data
+
+
+
+@njit(cache=True)
+def _rolling_extreme(values: np.ndarray, window: int, maximum: bool):
+    """
+    returns the rolling max (or min) of a vector using a monotonic deque
+    
+    parameters:
+        values (np.ndarray): vector of values, nan values are skipped
+        window (int): the size of the trailing window
+        maximum (bool): rolling max when true, rolling min otherwise
+    returns:
+        extremes (np.ndarray): vector of the rolling extreme, nan where the window holds no values
+    """
+    
+    n = values.shape[0]
+    extremes = np.empty(n, dtype=np.float64)
+    
+    # indices of candidate extremes, values kept monotonic from head to tail
+    deque = np.empty(n, dtype=np.int64)
+    head = 0
+    tail = 0
+    
+    for i in range(n):
+        if head < tail and deque[head] <= i - window:
+            head += 1
+        
+        x = values[i]
+        if not np.isnan(x):
+            if maximum:
+                while head < tail and values[deque[tail - 1]] <= x:
+                    tail -= 1
+            else:
+                while head < tail and values[deque[tail - 1]] >= x:
+                    tail -= 1
+            deque[tail] = i
+            tail += 1
+        
+        extremes[i] = values[deque[head]] if head < tail else np.nan
     
-    
\ No newline at end of file
+    return extremes
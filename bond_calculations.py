@@ -1,9 +1,14 @@
 """
 This file contains calculation functions to aid in bond analysis
 """
+import math
+from dataclasses import dataclass
+
 import numpy as np
+from numba import njit, prange
 
 
+@njit(cache=True)
 def bond_price(nominal: float, coupon: float, ytm: float, maturity: int, freq=2):
     """
     calculates the price of a bond
@@ -23,18 +28,80 @@ def bond_price(nominal: float, coupon: float, ytm: float, maturity: int, freq=2)
     
     discount_rate = ytm / freq 
     
-    present_coupon_value = 0
-    for t in range(1, total_payments + 1):
-        present_coupon_value += coupon_payment / (1 + discount_rate) ** t
+    bond_price = _present_value(coupon_payment, nominal, discount_rate, total_payments)
+    
+    return bond_price
+
+
+
+@njit(cache=True)
+def _present_value(coupon_payment: float, nominal: float, discount_rate: float, total_payments: int):
+    """
+    discounts a bond's cashflows given per-period values
+    
+    parameters:
+        coupon_payment (float): the coupon paid each period
+        nominal (float): the nominal value the bond
+        discount_rate (float): the yield per period
+        total_payments (int): the number of coupon payments
+    returns:
+        present_value (float): the present value of the coupons and nominal
+    """
+    
+    annuity, _, discount_factor = _discount_sums(discount_rate, total_payments)
+    
+    present_coupon_value = coupon_payment * annuity
         
-    present_nominal_value = nominal / (1 + discount_rate) ** total_payments
+    present_nominal_value = nominal * discount_factor
     
-    bond_price = present_coupon_value + present_nominal_value
+    present_value = present_coupon_value + present_nominal_value
     
-    return bond_price
+    return present_value
+
+
+
+@njit(cache=True)
+def _discount_sums(discount_rate: float, total_payments: int):
+    """
+    sums the discount factors v ** t over the coupon dates, with v = 1 / (1 + r)
+    
+    parameters:
+        discount_rate (float): the yield per period
+        total_payments (int): the number of coupon payments
+    returns:
+        annuity (float): Σ v ** t
+        weighted_periods (float): Σ t * v ** t
+        discount_factor (float): v ** n
+    """
+    
+    if total_payments != math.floor(total_payments):
+        raise ValueError("maturity * freq must be a whole number of payments")
+    
+    if abs(discount_rate) < 1e-3:
+        # the closed forms divide by r and cancel catastrophically near zero, so sum directly
+        v = 1 / (1 + discount_rate)
+        annuity = 0.0
+        weighted_periods = 0.0
+        discount_factor = 1.0
+        for t in range(1, int(total_payments) + 1):
+            discount_factor *= v
+            annuity += discount_factor
+            weighted_periods += t * discount_factor
+        return annuity, weighted_periods, discount_factor
+    
+    # log1p / expm1 keep 1 - (1 + r) ** -n accurate for small r
+    log_growth = -total_payments * math.log1p(discount_rate)
+    discount_factor = math.exp(log_growth)
+    annuity = -math.expm1(log_growth) / discount_rate
+    
+    # increasing annuity: ((1 + r) * Σ v ** t - n * v ** n) / r
+    weighted_periods = ((1 + discount_rate) * annuity - total_payments * discount_factor) / discount_rate
+    
+    return annuity, weighted_periods, discount_factor
 
 
 
+@njit(cache=True)
 def bond_duration(nominal: float, coupon: float, ytm: float, maturity: int, modified_duration=False, freq: int=2):
     """
     calculates the duration of a bond using the Macaulay equation
@@ -50,18 +117,16 @@ def bond_duration(nominal: float, coupon: float, ytm: float, maturity: int, modi
         mod_duration (float): the modified version 
     """
     
-    price = bond_price(nominal, coupon, ytm, maturity, freq=2)
-    
     coupon_payment = (nominal * coupon) / freq
     total_periods = freq * maturity
     period_yield = ytm / freq
     
-    numerator = 0
-    for t in range(1, total_periods + 1):
-        if t != total_periods:
-            numerator += (t * coupon_payment) / (1 + period_yield) ** t
-        else: 
-            numerator += (total_periods * (nominal + coupon_payment)) / (1 + period_yield) ** total_periods
+    # the price is built from the same discount sums rather than calling bond_price
+    annuity, weighted_periods, v_n = _discount_sums(period_yield, total_periods)
+    
+    price = coupon_payment * annuity + nominal * v_n
+    
+    numerator = coupon_payment * weighted_periods + total_periods * nominal * v_n
 
     duration = (numerator / price) / freq
     
@@ -74,6 +139,7 @@ def bond_duration(nominal: float, coupon: float, ytm: float, maturity: int, modi
 
 
 
+@njit(cache=True)
 def bond_convexity(nominal: float, coupon: float, ytm: float, maturity: int, freq: int=2):
     """
     estimates the convexity of a bond
@@ -90,13 +156,15 @@ def bond_convexity(nominal: float, coupon: float, ytm: float, maturity: int, fre
     
     dy = 0.01
     
-    ytm_minus = ytm - dy
-    price_minus = bond_price(nominal, coupon, ytm_minus, maturity, freq=2)
+    # only the yield is perturbed, so the per-period terms are shared by all three prices
+    total_payments = maturity * freq
+    coupon_payment = (nominal * coupon) / freq
     
-    ytm_plus = ytm + dy
-    price_plus = bond_price(nominal, coupon, ytm_plus, maturity, freq=2)
+    price_minus = _present_value(coupon_payment, nominal, (ytm - dy) / freq, total_payments)
     
-    price = bond_price(nominal, coupon, ytm, maturity, freq=2)
+    price_plus = _present_value(coupon_payment, nominal, (ytm + dy) / freq, total_payments)
+    
+    price = _present_value(coupon_payment, nominal, ytm / freq, total_payments)
 
     convexity = (price_plus + price_minus - 2 * price) / (price * dy ** 2)
     
@@ -104,9 +172,51 @@ def bond_convexity(nominal: float, coupon: float, ytm: float, maturity: int, fre
 
 
 
-def bond_ytm(nominal: float, market_price: float, coupon: float, maturity: int):
+@njit(cache=True)
+def bond_ytm(nominal: float, market_price: float, coupon: float, maturity: int, freq: int=2):
+    """
+    solves for the yield to maturity of a bond with newton-raphson
+    
+    parameters:
+        nominal (float): the nominal value the bond
+        market_price (float): current market price for the bond
+        coupon (float): the coupon rate of the bond (example: 0.06 (6%))
+        maturity (int): the number of years to maturity
+        freq (int): the number of payments in a year
+    returns:
+        ytm (float): returns the annual ytm of the bond, nan if the solver does not converge
+    """
+    
+    ytm = bond_ytm_approx(nominal, market_price, coupon, maturity)
+    
+    for _ in range(50):
+        # prices are only defined while 1 + ytm / freq > 0
+        if not (1 + ytm / freq > 0):
+            return np.nan
+        
+        price = bond_price(nominal, coupon, ytm, maturity, freq)
+        if not np.isfinite(price):
+            return np.nan
+        
+        diff = price - market_price
+        if abs(diff) < 1e-12 * market_price:
+            return ytm
+        
+        # dP/dy = -modified duration * price
+        slope = bond_duration(nominal, coupon, ytm, maturity, True, freq) * price
+        if not (slope != 0 and np.isfinite(slope)):
+            return np.nan
+        ytm += diff / slope
+    
+    # no convergence, rather than returning the last iterate
+    return np.nan
+
+
+
+@njit(cache=True)
+def bond_ytm_approx(nominal: float, market_price: float, coupon: float, maturity: int):
     """
-    estimates the yield to maturity of a bond
+    approximates the yield to maturity of a bond with the current yield formula
     
     parameters:
         nominal (float): the nominal value the bond
@@ -128,9 +238,9 @@ def bond_ytm(nominal: float, market_price: float, coupon: float, maturity: int):
 
 
 
-def adjusted_bond_price(nominal: float, coupon: float, ytm: float, maturity: int, freq: int=2, yield_changes: list=[-0.15, 0.15, 0.0001], return_yields=False):
+def adjusted_bond_price(nominal: float, coupon: float, ytm: float, maturity: int, freq: int=2, yield_changes: tuple=(-0.15, 0.15, 0.0001), return_yields=False):
     """
-    returns the list of adjusted bond prices with use of duration and convexity
+    returns the vector of adjusted bond prices with use of duration and convexity
     
     parameters:
         nominal (float): the nominal value the bond
@@ -138,27 +248,23 @@ def adjusted_bond_price(nominal: float, coupon: float, ytm: float, maturity: int
         ytm (float): the yield to maturity (example: 0.06 (6%))
         maturity (int): the number of years to maturity
         freq (int): the number of payments in a year
-        yield_changes (list): the range of rate changes to test with the step
+        yield_changes (tuple): the (start, stop, step) range of rate changes to test
         return_yields (bool): returns the list of yields for aid in plotting
     returns:
-        bond_prices (list): vector of bond_prices corresponding to rate
-        yield_change_range (list)
+        bond_prices (np.ndarray): vector of bond_prices corresponding to rate
+        yield_change_range (np.ndarray)
     """
     
-    yield_change_range = np.arange(yield_changes[0], yield_changes[1], yield_changes[2])
+    yield_change_range = np.arange(*yield_changes)
     
-    duration = bond_duration(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, freq=2)[1]
-    conv = bond_convexity(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, freq=2)
-    price = bond_price(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, freq=2)
+    duration = bond_duration(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, modified_duration=True, freq=freq)
+    conv = bond_convexity(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, freq=freq)
+    price = bond_price(nominal=nominal, coupon=coupon, ytm=ytm, maturity=maturity, freq=freq)
 
-    bond_prices = []
     # Δ bond price = -duration * Δy * 1/2 * conv * (Δy) ** 2
-    for i in yield_change_range:
-        one = -duration * i
-        two = 1/2 * conv * (i ** 2)
-        three = (one + two) + 1 # the 1 is added so you can just multiply by this value (e.g, 0.09 vs 1.09 for a 9% increase)
-        
-        bond_prices.append(three * price)
+    # the 1 is added so you can just multiply by this value (e.g, 0.09 vs 1.09 for a 9% increase)
+    dy = yield_change_range
+    bond_prices = price * (1 - duration * dy + 0.5 * conv * dy * dy)
         
     if return_yields:
         return bond_prices, yield_change_range
@@ -166,3 +272,93 @@ def adjusted_bond_price(nominal: float, coupon: float, ytm: float, maturity: int
         return bond_prices
 
 
+
+@njit(parallel=True, cache=True)
+def portfolio_metrics(nominals: np.ndarray, coupons: np.ndarray, ytms: np.ndarray, maturities: np.ndarray, freqs: np.ndarray):
+    """
+    calculates the price, duration and convexity for each bond in a portfolio
+    
+    parameters:
+        nominals (np.ndarray): the nominal value of each bond
+        coupons (np.ndarray): the coupon rate of each bond
+        ytms (np.ndarray): the yield to maturity of each bond
+        maturities (np.ndarray): the number of years to maturity of each bond
+        freqs (np.ndarray): the number of payments in a year for each bond
+    returns:
+        prices (np.ndarray): the price of each bond
+        durations (np.ndarray): the Macaulay duration of each bond
+        convexities (np.ndarray): the convexity of each bond
+    """
+    
+    n = nominals.shape[0]
+    prices = np.empty(n, dtype=np.float64)
+    durations = np.empty(n, dtype=np.float64)
+    convexities = np.empty(n, dtype=np.float64)
+    
+    # exceptions raised inside prange are not propagated, so validate before the parallel loop
+    for i in range(n):
+        if maturities[i] * freqs[i] != math.floor(maturities[i] * freqs[i]):
+            raise ValueError("maturity * freq must be a whole number of payments")
+    
+    for i in prange(n):
+        prices[i] = bond_price(nominals[i], coupons[i], ytms[i], maturities[i], freqs[i])
+        durations[i] = bond_duration(nominals[i], coupons[i], ytms[i], maturities[i], False, freqs[i])
+        convexities[i] = bond_convexity(nominals[i], coupons[i], ytms[i], maturities[i], freqs[i])
+    
+    return prices, durations, convexities
+
+
+
+@dataclass
+class BondPortfolio:
+    """
+    a portfolio of bonds stored as parallel contiguous arrays, one entry per bond
+    
+    parameters:
+        nominals (np.ndarray): the nominal value of each bond
+        coupons (np.ndarray): the coupon rate of each bond
+        ytms (np.ndarray): the yield to maturity of each bond
+        maturities (np.ndarray): the number of years to maturity of each bond
+        freqs (np.ndarray): the number of payments in a year for each bond, defaults to 2
+    """
+    
+    nominals: np.ndarray
+    coupons: np.ndarray
+    ytms: np.ndarray
+    maturities: np.ndarray
+    freqs: np.ndarray = None
+    
+    def __post_init__(self):
+        self.nominals = np.ascontiguousarray(self.nominals, dtype=np.float64)
+        self.coupons = np.ascontiguousarray(self.coupons, dtype=np.float64)
+        self.ytms = np.ascontiguousarray(self.ytms, dtype=np.float64)
+        
+        maturities = np.asarray(self.maturities)
+        if not np.all(maturities == np.round(maturities)):
+            raise ValueError("maturities must be whole numbers of years")
+        self.maturities = np.ascontiguousarray(maturities, dtype=np.int32)
+        
+        if self.freqs is None:
+            self.freqs = np.full(self.nominals.shape[0], 2, dtype=np.int32)
+        else:
+            self.freqs = np.ascontiguousarray(self.freqs, dtype=np.int32)
+        
+        n = self.nominals.shape[0]
+        for name in ("coupons", "ytms", "maturities", "freqs"):
+            if getattr(self, name).shape != (n,):
+                raise ValueError(f"{name} must be a vector with one entry per bond ({n})")
+    
+    def __len__(self):
+        return self.nominals.shape[0]
+    
+    def metrics(self):
+        """
+        calculates the price, duration and convexity of each bond
+        
+        returns:
+            prices (np.ndarray): the price of each bond
+            durations (np.ndarray): the Macaulay duration of each bond
+            convexities (np.ndarray): the convexity of each bond
+        """
+        
+        return portfolio_metrics(self.nominals, self.coupons, self.ytms, self.maturities, self.freqs)